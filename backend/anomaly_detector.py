@@ -0,0 +1,255 @@
+import math
+import threading
+
+# --- DETECTOR CONFIG ---
+LANES = 4
+NOMINAL_PHASE_S = 5.5          # 5000ms green + 500ms all-red (matches ESP32 loop)
+SILENCE_TIMEOUT_S = 15.0       # ~3 missed "Green:" logs
+FLAP_RATE_PER_MIN = 20.0       # Priority Switch rate that counts as churn
+FLAP_TAU_S = 60.0              # Decay constant of the switch-rate estimate
+PHASE_ALPHA = 0.1              # EWMA weight for phase lengths
+SHARE_ALPHA = 0.05             # EWMA weight for per-lane priority share
+STUCK_MIN_SWITCHES = 20        # Priority switches seen before judging a lane
+STUCK_DOMINANT_SHARE = 0.75    # Lane wins almost every switch -> sensor stuck "near"
+STUCK_STARVED_SHARE = 0.02     # Lane never wins a switch -> sensor stuck "far"
+DRIFT_MIN_PHASES = 10          # Round-robin phases seen before judging drift
+DRIFT_TOLERANCE = 0.2          # Allowed relative error of the EWMA phase length
+
+
+# --- TIMER WHEEL ---
+class TimerWheel:
+    """Hashed timing wheel: O(1) schedule/cancel, expiry cost proportional to due keys."""
+
+    def __init__(self, slots=64, resolution=1.0):
+        self.resolution = resolution
+        self._slots = [dict() for _ in range(slots)]
+        self._where = {}
+        self._cursor = None
+
+    def _tick(self, t):
+        return int(t // self.resolution)
+
+    def schedule(self, key, deadline):
+        self.cancel(key)
+        # Round up: the slot is only visited once `now` reaches its tick, so a
+        # deadline with a fractional second must not land in an earlier slot
+        slot = self._slots[math.ceil(deadline / self.resolution) % len(self._slots)]
+        slot[key] = deadline
+        self._where[key] = slot
+
+    def cancel(self, key):
+        slot = self._where.pop(key, None)
+        if slot is not None:
+            slot.pop(key, None)
+
+    def advance(self, now):
+        """Returns the keys whose deadline is <= now."""
+        target = self._tick(now)
+        if self._cursor is None:
+            self._cursor = target
+        # Never walk more than one full revolution, the remaining ticks map to the same slots
+        start = max(self._cursor, target - len(self._slots) + 1)
+        expired = []
+        for tick in range(start, target + 1):
+            slot = self._slots[tick % len(self._slots)]
+            for key, deadline in list(slot.items()):
+                if deadline <= now:
+                    del slot[key]
+                    del self._where[key]
+                    expired.append(key)
+        self._cursor = target + 1
+        return expired
+
+
+# --- PER-UNIT STATE ---
+class UnitStats:
+    __slots__ = (
+        "last_seen", "lane", "phase_start", "pending_priority", "in_override",
+        "ewma_phase", "phases", "switch_rate", "switch_ts", "switches",
+        "lane_share", "flags",
+    )
+
+    def __init__(self, now):
+        self.last_seen = now
+        self.lane = None
+        self.phase_start = now
+        self.pending_priority = False
+        self.in_override = False
+        self.ewma_phase = NOMINAL_PHASE_S
+        self.phases = 0
+        self.switch_rate = 0.0      # Priority switches per second (exponentially decayed)
+        self.switch_ts = now
+        self.switches = 0
+        self.lane_share = [1.0 / LANES] * LANES
+        self.flags = set()          # Currently raised alert keys, e.g. "flapping", "stuck_lane:2"
+
+
+def _switches_per_min(stats, now):
+    """Priority switch rate decayed up to `now`."""
+    return stats.switch_rate * math.exp(-(now - stats.switch_ts) / FLAP_TAU_S) * 60.0
+
+
+def _parse_lane(payload):
+    try:
+        return int(payload.rsplit(" ", 1)[-1])
+    except ValueError:
+        return None
+
+
+# --- DETECTOR ---
+class AnomalyDetector:
+    """
+    Streaming detector fed with every unit log the gateway forwards.
+    Keeps a fixed amount of state per unit and calls `on_alert(alert_dict)`
+    whenever a condition is raised or cleared.
+    """
+
+    def __init__(self, on_alert, silence_timeout=SILENCE_TIMEOUT_S):
+        self.on_alert = on_alert
+        self.silence_timeout = silence_timeout
+        self.units = {}
+        self._wheel = TimerWheel()
+        self._flapping = set()      # Units with "flapping" raised, re-checked on every tick
+        self._lock = threading.Lock()
+
+    def observe(self, unit_id, payload, now):
+        with self._lock:
+            alerts = self._observe(unit_id, payload, now)
+        for alert in alerts:
+            self.on_alert(alert)
+
+    def tick(self, now):
+        """Expire silence timers. Call periodically (once per second is enough)."""
+        alerts = []
+        with self._lock:
+            for unit_id in self._wheel.advance(now):
+                stats = self.units.get(unit_id)
+                if stats is not None:
+                    self._raise(alerts, unit_id, stats, "silent", now,
+                                silent_for=round(now - stats.last_seen, 1))
+            # A unit that stopped switching sends nothing that would clear the flag
+            for unit_id in list(self._flapping):
+                stats = self.units[unit_id]
+                if _switches_per_min(stats, now) < FLAP_RATE_PER_MIN / 2:
+                    self._flapping.discard(unit_id)
+                    self._clear(alerts, unit_id, stats, "flapping", now)
+        for alert in alerts:
+            self.on_alert(alert)
+
+    # --- snapshot support ---
+    def snapshot(self):
+        """Returns {unit_id: (last_seen, lane)}."""
+        with self._lock:
+            return {unit_id: (s.last_seen, s.lane) for unit_id, s in self.units.items()}
+
+    def restore(self, unit_id, last_seen, lane, now):
+        """Re-creates a unit from a snapshot. The silence timer restarts at `now`."""
+        with self._lock:
+            stats = self.units[unit_id] = UnitStats(last_seen)
+            stats.lane = lane
+            # The phase running at shutdown is unknown, do not time it
+            stats.phase_start = None
+            self._wheel.schedule(unit_id, now + self.silence_timeout)
+
+    # --- internals (called with the lock held) ---
+    def _observe(self, unit_id, payload, now):
+        alerts = []
+        stats = self.units.get(unit_id)
+        if stats is None:
+            stats = self.units[unit_id] = UnitStats(now)
+        stats.last_seen = now
+        self._wheel.schedule(unit_id, now + self.silence_timeout)
+        self._clear(alerts, unit_id, stats, "silent", now)
+
+        if payload.startswith("Green: Lane"):
+            self._on_green(alerts, unit_id, stats, _parse_lane(payload), now)
+        elif payload.startswith("Priority Switch"):
+            self._on_priority(alerts, unit_id, stats, _parse_lane(payload), now)
+        elif payload.startswith("Override"):
+            stats.in_override = True
+        elif payload == "ONLINE":
+            # Reboot: the running phase is meaningless
+            stats.lane = None
+            stats.in_override = False
+            stats.pending_priority = False
+        return alerts
+
+    def _on_green(self, alerts, unit_id, stats, lane, now):
+        if lane is None or not 0 <= lane < LANES:
+            return
+        # In override mode the ESP32 republishes the same lane every loop iteration
+        if lane == stats.lane:
+            return
+        previous = stats.lane
+        if (previous is not None and stats.phase_start is not None
+                and not stats.in_override and not stats.pending_priority
+                and lane == (previous + 1) % LANES):
+            phase = now - stats.phase_start
+            stats.ewma_phase += PHASE_ALPHA * (phase - stats.ewma_phase)
+            stats.phases += 1
+            if stats.phases >= DRIFT_MIN_PHASES:
+                error = (stats.ewma_phase - NOMINAL_PHASE_S) / NOMINAL_PHASE_S
+                if abs(error) > DRIFT_TOLERANCE:
+                    self._raise(alerts, unit_id, stats, "clock_drift", now,
+                                phase_s=round(stats.ewma_phase, 2), nominal_s=NOMINAL_PHASE_S)
+                else:
+                    self._clear(alerts, unit_id, stats, "clock_drift", now)
+        stats.lane = lane
+        stats.phase_start = now
+        stats.pending_priority = False
+        stats.in_override = False
+
+    def _on_priority(self, alerts, unit_id, stats, lane, now):
+        if lane is None or not 0 <= lane < LANES:
+            return
+        stats.pending_priority = True
+
+        # Flapping: exponentially decayed event rate
+        stats.switch_rate = _switches_per_min(stats, now) / 60.0 + 1.0 / FLAP_TAU_S
+        stats.switch_ts = now
+        per_min = stats.switch_rate * 60.0
+        if per_min > FLAP_RATE_PER_MIN:
+            self._flapping.add(unit_id)
+            self._raise(alerts, unit_id, stats, "flapping", now, switches_per_min=round(per_min, 1))
+        elif per_min < FLAP_RATE_PER_MIN / 2:
+            self._flapping.discard(unit_id)
+            self._clear(alerts, unit_id, stats, "flapping", now)
+
+        # Stuck sensors: one lane wins every switch, or one lane never does
+        share = stats.lane_share
+        for i in range(LANES):
+            share[i] += SHARE_ALPHA * ((1.0 if i == lane else 0.0) - share[i])
+        stats.switches += 1
+        if stats.switches < STUCK_MIN_SWITCHES:
+            return
+        for i in range(LANES):
+            key = f"stuck_lane:{i}"
+            if share[i] > STUCK_DOMINANT_SHARE:
+                self._raise(alerts, unit_id, stats, key, now, lane=i, mode="dominant", share=round(share[i], 3))
+            elif share[i] < STUCK_STARVED_SHARE:
+                self._raise(alerts, unit_id, stats, key, now, lane=i, mode="starved", share=round(share[i], 3))
+            else:
+                self._clear(alerts, unit_id, stats, key, now)
+
+    def _raise(self, alerts, unit_id, stats, key, now, **detail):
+        if key in stats.flags:
+            return
+        stats.flags.add(key)
+        alerts.append(_alert(unit_id, key, "raised", now, detail))
+
+    def _clear(self, alerts, unit_id, stats, key, now):
+        if key not in stats.flags:
+            return
+        stats.flags.discard(key)
+        alerts.append(_alert(unit_id, key, "cleared", now, {}))
+
+
+def _alert(unit_id, key, state, now, detail):
+    return {
+        "type": "alert",
+        "unit_id": unit_id,
+        "kind": key.split(":", 1)[0],
+        "state": state,
+        "detail": detail,
+        "timestamp": now,
+    }
@@ -0,0 +1,56 @@
+import time
+
+from command_admission import CommandAdmission, POLICY_LATEST, POLICY_PRIORITY
+
+# Micro-benchmark for the override admission hot path.
+# Usage: python backend/bench_command_admission.py
+
+UNITS = 5000
+COMMANDS = 200000
+BUDGET_US = 1000.0  # Must stay well under a millisecond per command
+
+
+def run(policy):
+    admission = CommandAdmission(policy)
+    now = 1000.0
+    units = [f"INT_{i:04X}" for i in range(UNITS)]
+    for unit_id in units:
+        admission.register(unit_id, now)
+
+    # Mix of accepted, rate-limited, conflicting and malformed commands
+    payloads = [
+        {"lane": 1, "duration": 10000},
+        {"lane": 2, "time": 5000, "priority": 3},
+        {"lane": 3, "duration": 60000, "priority": 9},
+        {"lane": 7, "duration": 10000},
+        {"lane": "1", "duration": 10000},
+        {"duration": 10000},
+    ]
+
+    latencies = []
+    accepted = 0
+    clock = time.perf_counter
+    for i in range(COMMANDS):
+        unit_id = units[i % UNITS]
+        payload = payloads[i % len(payloads)]
+        now += 0.001
+        start = clock()
+        cmd, _ = admission.admit(unit_id, payload, now)
+        latencies.append(clock() - start)
+        if cmd is not None:
+            accepted += 1
+
+    latencies.sort()
+    mean_us = sum(latencies) / len(latencies) * 1e6
+    p99_us = latencies[int(len(latencies) * 0.99)] * 1e6
+    max_us = latencies[-1] * 1e6
+    print(f"[BENCH] policy={policy:<8} commands={COMMANDS} accepted={accepted} "
+          f"mean={mean_us:.2f}us p99={p99_us:.2f}us max={max_us:.2f}us")
+    return p99_us
+
+
+if __name__ == "__main__":
+    worst = max(run(POLICY_PRIORITY), run(POLICY_LATEST))
+    if worst >= BUDGET_US:
+        raise SystemExit(f"[BENCH] FAIL: p99 {worst:.2f}us exceeds {BUDGET_US:.0f}us budget")
+    print(f"[BENCH] OK: p99 {worst:.2f}us < {BUDGET_US:.0f}us budget")
@@ -0,0 +1,155 @@
+import re
+import threading
+
+# --- ADMISSION CONFIG ---
+LANES = 4                      # Fixed: units do not report their lane count
+MIN_DURATION_MS = 1000
+MAX_DURATION_MS = 120000
+DEFAULT_DURATION_MS = 5000
+MAX_PRIORITY = 9
+BUCKET_CAPACITY = 3            # Burst of overrides allowed per unit
+BUCKET_REFILL_PER_S = 0.2      # One extra override every 5s
+MIN_DWELL_S = 5.0              # An accepted override cannot be replaced before this
+POLICY_PRIORITY = "priority"   # Higher (or equal, after dwell) priority wins
+POLICY_LATEST = "latest"       # Newest command wins once the dwell time has passed
+
+# Unit IDs end up in MQTT topics: no wildcards, separators or empty strings
+UNIT_ID_RE = re.compile(r"[A-Za-z0-9_-]{1,32}")
+
+
+# --- SCHEMA ---
+def _int_field(name, lo, hi, required=False, default=None):
+    """Precompiled validator for one integer field. Returns (value, error)."""
+    def check(payload):
+        # An explicit JSON null counts as a missing key
+        value = payload.get(name)
+        if value is None:
+            return (None, f"missing '{name}'") if required else (default, None)
+        # bool is an int subclass, reject it explicitly
+        if type(value) is not int:
+            return None, f"'{name}' must be an integer"
+        if not lo <= value <= hi:
+            return None, f"'{name}' out of range [{lo}, {hi}]"
+        return value, None
+    return check
+
+_check_lane = _int_field("lane", 0, LANES - 1, required=True)
+_check_priority = _int_field("priority", 0, MAX_PRIORITY, default=0)
+_check_duration = _int_field("duration", MIN_DURATION_MS, MAX_DURATION_MS)
+_check_time = _int_field("time", MIN_DURATION_MS, MAX_DURATION_MS, default=DEFAULT_DURATION_MS)
+
+
+def validate_command(payload):
+    """
+    Validates an override payload ({"lane", "duration"|"time", "priority"?}).
+    Returns (command, None) with a normalized dict, or (None, reason).
+    """
+    if type(payload) is not dict:
+        return None, "payload must be a JSON object"
+    lane, err = _check_lane(payload)
+    if err:
+        return None, err
+    # Both spellings are in use (dashboards send "duration", the CLI sends "time")
+    duration, err = _check_duration(payload)
+    if err:
+        return None, err
+    if duration is None:
+        duration, err = _check_time(payload)
+        if err:
+            return None, err
+    priority, err = _check_priority(payload)
+    if err:
+        return None, err
+    return {"lane": lane, "duration": duration, "priority": priority}, None
+
+
+# --- PER-UNIT STATE ---
+class UnitEntry:
+    __slots__ = ("tokens", "refilled", "lane", "priority", "started", "deadline")
+
+    def __init__(self, now):
+        self.tokens = float(BUCKET_CAPACITY)
+        self.refilled = now
+        # Active override (lane is None when there is none)
+        self.lane = None
+        self.priority = 0
+        self.started = 0.0
+        self.deadline = 0.0
+
+
+# --- ADMISSION ---
+class CommandAdmission:
+    """
+    O(1) per-command gate in front of the override path: schema and lane
+    range, unit registry, token-bucket rate limit, then conflict resolution against
+    the unit's active override.
+    """
+
+    def __init__(self, policy=POLICY_PRIORITY, min_dwell=MIN_DWELL_S):
+        if policy not in (POLICY_PRIORITY, POLICY_LATEST):
+            raise ValueError(f"Unknown conflict policy: {policy}")
+        self.policy = policy
+        self.min_dwell = min_dwell
+        self.units = {}
+        self._lock = threading.Lock()
+
+    def register(self, unit_id, now):
+        """Adds a unit to the registry (no-op if it is already known)."""
+        if unit_id not in self.units and UNIT_ID_RE.fullmatch(unit_id):
+            with self._lock:
+                self.units.setdefault(unit_id, UnitEntry(now))
+
+    def admit(self, unit_id, payload, now):
+        """Returns (command, None) if the override may be forwarded, else (None, reason)."""
+        if not UNIT_ID_RE.fullmatch(unit_id):
+            return None, "invalid unit id"
+        cmd, err = validate_command(payload)
+        if err:
+            return None, err
+        with self._lock:
+            entry = self.units.get(unit_id)
+            if entry is None:
+                return None, "unknown unit"
+
+            # Conflict resolution first: a rejected command must not burn a token
+            if entry.lane is not None and now < entry.deadline:
+                in_dwell = now < entry.started + self.min_dwell
+                if self.policy == POLICY_PRIORITY:
+                    if cmd["priority"] < entry.priority:
+                        return None, f"lower priority than active override (priority {entry.priority})"
+                    if in_dwell and cmd["priority"] == entry.priority:
+                        return None, "active override is within its minimum dwell time"
+                elif in_dwell:
+                    return None, "active override is within its minimum dwell time"
+
+            tokens = min(BUCKET_CAPACITY, entry.tokens + (now - entry.refilled) * BUCKET_REFILL_PER_S)
+            entry.refilled = now
+            if tokens < 1.0:
+                entry.tokens = tokens
+                return None, "rate limited"
+            entry.tokens = tokens - 1.0
+
+            entry.lane = cmd["lane"]
+            entry.priority = cmd["priority"]
+            entry.started = now
+            entry.deadline = now + cmd["duration"] / 1000.0
+        return cmd, None
+
+    # --- snapshot support ---
+    def snapshot(self):
+        """Returns one (unit_id, tokens, refilled, lane, priority, started, deadline) row per unit."""
+        with self._lock:
+            return [
+                (unit_id, e.tokens, e.refilled, e.lane, e.priority, e.started, e.deadline)
+                for unit_id, e in self.units.items()
+            ]
+
+    def restore(self, unit_id, tokens, refilled, lane, priority, started, deadline):
+        entry = UnitEntry(refilled)
+        entry.tokens = tokens
+        entry.lane = lane
+        entry.priority = priority
+        entry.started = started
+        entry.deadline = deadline
+        with self._lock:
+            self.units[unit_id] = entry
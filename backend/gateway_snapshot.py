@@ -0,0 +1,94 @@
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+# --- FORMAT ---
+# Header: magic, version, record size, saved_at, record count, CRC32 of the records
+# Record: one fixed-size entry per unit, so the file can be mmapped and read in place
+MAGIC = b"TGSS"
+VERSION = 2
+HEADER = struct.Struct("<4sHHdII")
+RECORD = struct.Struct("<32sbBb5d")
+
+NO_LANE = -1
+
+# The periodic thread and the shutdown path both save; they share one temp file
+_save_lock = threading.Lock()
+
+
+def _pack_lane(lane):
+    # Anything a signed byte cannot hold (or that is no lane at all) is stored as NO_LANE
+    return lane if lane is not None and 0 <= lane <= 127 else NO_LANE
+
+
+def _pack_unit(admission_row, detector_row):
+    unit_id, tokens, refilled, lane, priority, started, deadline = admission_row
+    last_seen, current_lane = detector_row if detector_row else (refilled, None)
+    return RECORD.pack(
+        unit_id.encode(),
+        _pack_lane(lane),
+        priority,
+        _pack_lane(current_lane),
+        tokens, refilled, started, deadline, last_seen,
+    )
+
+
+def save_snapshot(path, admission, detector, now=None):
+    """Writes the unit registry, override and detector state atomically to `path`."""
+    now = time.time() if now is None else now
+    seen = detector.snapshot()
+    body = b"".join(_pack_unit(row, seen.get(row[0])) for row in admission.snapshot())
+    count = len(body) // RECORD.size
+    header = HEADER.pack(MAGIC, VERSION, RECORD.size, now, count, zlib.crc32(body))
+
+    tmp = path + ".tmp"
+    with _save_lock:
+        with open(tmp, "wb") as f:
+            f.write(header)
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    return count
+
+
+def load_snapshot(path, admission, detector, now=None):
+    """
+    Restores state saved by save_snapshot into `admission` and `detector`.
+    Overrides are reconciled against their original deadlines: expired ones
+    are dropped, live ones are returned as (unit_id, lane, deadline) so the
+    caller can re-issue them for the remaining time. Returns (units_restored, resumed_overrides).
+    """
+    now = time.time() if now is None else now
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return 0, []
+
+    with f:
+        if os.fstat(f.fileno()).st_size < HEADER.size:
+            raise ValueError("snapshot truncated")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, version, record_size, _, count, crc = HEADER.unpack_from(mm, 0)
+            if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+                raise ValueError("unsupported snapshot format")
+            end = HEADER.size + count * RECORD.size
+            if len(mm) < end or zlib.crc32(mm[HEADER.size:end]) != crc:
+                raise ValueError("snapshot corrupt")
+
+            resumed = []
+            for offset in range(HEADER.size, end, RECORD.size):
+                (raw_id, lane, priority, current_lane,
+                 tokens, refilled, started, deadline, last_seen) = RECORD.unpack_from(mm, offset)
+                unit_id = raw_id.rstrip(b"\0").decode()
+
+                if lane == NO_LANE or deadline <= now:
+                    lane = None
+                else:
+                    resumed.append((unit_id, lane, deadline))
+                admission.restore(unit_id, tokens, refilled, lane, priority, started, deadline)
+                detector.restore(unit_id, last_seen, None if current_lane == NO_LANE else current_lane, now)
+    return count, resumed
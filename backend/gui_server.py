@@ -9,6 +9,8 @@ from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
 
 import os
 
+from command_admission import UNIT_ID_RE, validate_command
+
 # --- AWS CONFIG ---
 AWS_ENDPOINT = "a23rgceujjdkf1-ats.iot.us-east-1.amazonaws.com"
 CLIENT_ID = "WebControlPanel"
@@ -22,6 +24,7 @@ PATH_TO_ROOT = os.path.join(CONFIG_DIR, "root-CA.crt")
 
 TOPIC_LOGS = "traffic/+/logs"
 TOPIC_GATEWAY_LOGS = "traffic/gateway/logs"
+TOPIC_GATEWAY_STATE = "traffic/gateway/state"
 
 # --- GLOBAL STATE ---
 devices = {'INT_WEB'} # Pre-populate
@@ -39,6 +42,18 @@ def on_message(client, userdata, msg):
     except:
         pass
 
+def on_state(client, userdata, msg):
+    # Gateway state (restored from its snapshot on restart) lists every known unit
+    try:
+        state = json.loads(msg.payload.decode())
+        for unit in state.get("units", []):
+            device_id = unit.get("unit_id")
+            if device_id and device_id not in devices:
+                devices.add(device_id)
+                print(f"[DISCOVERY] New Device (gateway state): {device_id}")
+    except:
+        pass
+
 def start_mqtt():
     global mqtt_client
     mqtt_client = AWSIoTMQTTClient(CLIENT_ID)
@@ -51,6 +66,7 @@ def start_mqtt():
     
     mqtt_client.subscribe(TOPIC_LOGS, 1, on_message)
     mqtt_client.subscribe(TOPIC_GATEWAY_LOGS, 1, on_message)
+    mqtt_client.subscribe(TOPIC_GATEWAY_STATE, 1, on_state)
 
 # --- WEB SERVER ---
 PORT = 8090
@@ -75,22 +91,35 @@ class ControlHandler(http.server.SimpleHTTPRequestHandler):
             lane = query.get('lane', [None])[0]
             duration = query.get('duration', ['10'])[0]
 
-            if target and lane:
-                topic = f"traffic/{target}/control"
-                payload = json.dumps({
-                    "lane": int(lane),
-                    "duration": int(duration) * 1000
-                })
-                mqtt_client.publish(topic, payload, 1)
-                print(f"[CMD] Sent Override -> {target} Lane {lane}")
-                
-                self.send_response(200)
-                self.end_headers()
-                self.wfile.write(b"OK")
-            else:
+            if not (target and lane):
                 self.send_response(400)
                 self.end_headers()
                 self.wfile.write(b"Missing params")
+                return
+
+            try:
+                cmd, reason = validate_command({"lane": int(lane), "duration": int(duration) * 1000})
+            except ValueError:
+                cmd, reason = None, "lane and duration must be integers"
+            if not UNIT_ID_RE.fullmatch(target):
+                cmd, reason = None, "invalid target"
+            if cmd is None:
+                self.send_response(400)
+                self.end_headers()
+                self.wfile.write(f"Invalid params: {reason}".encode())
+                return
+
+            topic = f"traffic/{target}/control"
+            payload = json.dumps({
+                "lane": cmd["lane"],
+                "duration": cmd["duration"]
+            })
+            mqtt_client.publish(topic, payload, 1)
+            print(f"[CMD] Sent Override -> {target} Lane {cmd['lane']}")
+
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b"OK")
             return
 
         # Serve Dashboard (embedded HTML)
@@ -0,0 +1,52 @@
+from anomaly_detector import AnomalyDetector, TimerWheel
+
+
+def test_timer_wheel_fires_fractional_deadline_on_time():
+    wheel = TimerWheel()
+    wheel.advance(1000.5)
+    wheel.schedule("U", 1015.7)
+    fired_at = None
+    now = 1001.5
+    while fired_at is None and now < 1100:
+        if wheel.advance(now):
+            fired_at = now
+        now += 1.0
+    # First 1s tick at or after the deadline, not one revolution later
+    assert fired_at == 1016.5
+
+
+def test_silent_alert_raised_after_timeout():
+    alerts = []
+    detector = AnomalyDetector(alerts.append)
+    detector.tick(1000.5)
+    detector.observe("U", "Green: Lane 0", 1000.7)
+    now = 1001.5
+    while not alerts and now < 1100:
+        detector.tick(now)
+        now += 1.0
+    assert alerts[0]["kind"] == "silent"
+    assert alerts[0]["timestamp"] == 1016.5
+
+
+def test_out_of_range_green_lane_is_ignored():
+    detector = AnomalyDetector(lambda alert: None)
+    detector.observe("U", "Green: Lane 1", 1000.0)
+    detector.observe("U", "Green: Lane 200", 1001.0)
+    assert detector.snapshot()["U"] == (1001.0, 1)
+
+
+def test_flapping_clears_when_switching_stops():
+    alerts = []
+    detector = AnomalyDetector(alerts.append)
+    now = 1000.0
+    for i in range(40):
+        detector.observe("U", f"Priority Switch -> Lane {i % 4}", now)
+        now += 1.0
+    assert [a["state"] for a in alerts if a["kind"] == "flapping"] == ["raised"]
+
+    # Keep the unit alive but quiet: only the tick can clear the flag
+    while now < 1300:
+        detector.observe("U", "ONLINE", now)
+        detector.tick(now)
+        now += 1.0
+    assert [a["state"] for a in alerts if a["kind"] == "flapping"] == ["raised", "cleared"]
@@ -0,0 +1,152 @@
+import pytest
+
+from command_admission import (
+    BUCKET_CAPACITY,
+    BUCKET_REFILL_PER_S,
+    DEFAULT_DURATION_MS,
+    MAX_DURATION_MS,
+    MIN_DWELL_S,
+    POLICY_LATEST,
+    POLICY_PRIORITY,
+    CommandAdmission,
+    validate_command,
+)
+
+
+def make_admission(policy=POLICY_PRIORITY, unit_id="INT_A1B2", now=0.0):
+    admission = CommandAdmission(policy)
+    admission.register(unit_id, now)
+    return admission
+
+
+# --- validate_command ---
+@pytest.mark.parametrize("payload, reason", [
+    ({"lane": None}, "missing 'lane'"),
+    ({"duration": 10000}, "missing 'lane'"),
+    ({"lane": True}, "'lane' must be an integer"),
+    ({"lane": "1"}, "'lane' must be an integer"),
+    ({"lane": 1, "duration": "10000"}, "'duration' must be an integer"),
+    ({"lane": 1, "time": False}, "'time' must be an integer"),
+    ({"lane": 1, "priority": "9"}, "'priority' must be an integer"),
+    ({"lane": 4}, "'lane' out of range [0, 3]"),
+    ({"lane": -1}, "'lane' out of range [0, 3]"),
+    ({"lane": 1, "duration": 999}, "'duration' out of range"),
+    ({"lane": 1, "duration": MAX_DURATION_MS + 1}, "'duration' out of range"),
+    ({"lane": 1, "time": 0}, "'time' out of range"),
+    ([1, 10000], "payload must be a JSON object"),
+])
+def test_validate_rejects(payload, reason):
+    cmd, err = validate_command(payload)
+    assert cmd is None
+    assert err.startswith(reason)
+
+
+@pytest.mark.parametrize("payload", [
+    {"lane": 1, "time": None},
+    {"lane": 1, "duration": None, "time": None},
+    {"lane": 1},
+])
+def test_validate_null_or_missing_duration_uses_default(payload):
+    cmd, err = validate_command(payload)
+    assert err is None
+    assert cmd == {"lane": 1, "duration": DEFAULT_DURATION_MS, "priority": 0}
+
+
+def test_validate_null_priority_uses_default():
+    cmd, err = validate_command({"lane": 2, "duration": 30000, "priority": None})
+    assert err is None
+    assert cmd["priority"] == 0
+
+
+def test_validate_duration_takes_precedence_over_time():
+    cmd, _ = validate_command({"lane": 0, "duration": 20000, "time": 3000})
+    assert cmd["duration"] == 20000
+    cmd, _ = validate_command({"lane": 0, "time": 3000})
+    assert cmd["duration"] == 3000
+
+
+# --- unit registry ---
+@pytest.mark.parametrize("unit_id", ["", "INT/1", "traffic/#", "+", "X" * 33])
+def test_admit_rejects_invalid_unit_id(unit_id):
+    admission = make_admission()
+    assert admission.admit(unit_id, {"lane": 1}, 0.0) == (None, "invalid unit id")
+
+
+def test_admit_rejects_unknown_unit():
+    admission = make_admission()
+    assert admission.admit("INT_FFFF", {"lane": 1}, 0.0) == (None, "unknown unit")
+
+
+def test_register_ignores_invalid_unit_id():
+    admission = CommandAdmission()
+    admission.register("traffic/#", 0.0)
+    assert admission.units == {}
+
+
+# --- rate limit ---
+def test_bucket_exhaustion_and_refill():
+    admission = CommandAdmission(POLICY_LATEST, min_dwell=0.0)
+    admission.register("U", 0.0)
+    cmd = {"lane": 1, "duration": 1000}
+    for _ in range(BUCKET_CAPACITY):
+        assert admission.admit("U", cmd, 0.0)[1] is None
+    assert admission.admit("U", cmd, 0.0) == (None, "rate limited")
+    # One token is back after 1 / BUCKET_REFILL_PER_S seconds
+    refill = 1.0 / BUCKET_REFILL_PER_S
+    assert admission.admit("U", cmd, refill - 0.1) == (None, "rate limited")
+    assert admission.admit("U", cmd, refill + 0.1)[1] is None
+
+
+def test_conflict_rejection_does_not_use_a_token():
+    admission = make_admission(unit_id="U")
+    assert admission.admit("U", {"lane": 1, "duration": 60000}, 0.0)[1] is None
+    tokens = admission.units["U"].tokens
+    for _ in range(10):
+        cmd, err = admission.admit("U", {"lane": 2, "duration": 60000}, 1.0)
+        assert cmd is None and "dwell" in err
+    assert admission.units["U"].tokens == tokens
+    assert admission.units["U"].lane == 1
+
+
+# --- conflict policies ---
+def test_priority_policy():
+    admission = make_admission(POLICY_PRIORITY, unit_id="U")
+    assert admission.admit("U", {"lane": 1, "duration": 60000, "priority": 5}, 0.0)[1] is None
+
+    # Inside the dwell: lower and equal priority lose, higher priority preempts
+    assert "lower priority" in admission.admit("U", {"lane": 2, "priority": 4}, 1.0)[1]
+    assert "dwell" in admission.admit("U", {"lane": 2, "priority": 5}, 1.0)[1]
+    assert admission.admit("U", {"lane": 2, "duration": 60000, "priority": 6}, 2.0)[1] is None
+
+    # After the dwell: equal priority wins, lower still loses
+    after = 2.0 + MIN_DWELL_S + 0.1
+    assert "lower priority" in admission.admit("U", {"lane": 3, "priority": 5}, after)[1]
+    assert admission.admit("U", {"lane": 3, "priority": 6}, after)[1] is None
+    assert admission.units["U"].lane == 3
+
+
+def test_latest_policy():
+    admission = make_admission(POLICY_LATEST, unit_id="U")
+    assert admission.admit("U", {"lane": 1, "duration": 60000, "priority": 9}, 0.0)[1] is None
+
+    # Inside the dwell nothing replaces it, not even a higher priority
+    assert "dwell" in admission.admit("U", {"lane": 2, "priority": 9}, 1.0)[1]
+
+    # After the dwell the newest command wins regardless of priority
+    assert admission.admit("U", {"lane": 2, "priority": 0}, MIN_DWELL_S + 0.1)[1] is None
+    assert admission.units["U"].lane == 2
+
+
+def test_expired_override_does_not_conflict():
+    admission = make_admission(unit_id="U")
+    assert admission.admit("U", {"lane": 1, "duration": 1000, "priority": 9}, 0.0)[1] is None
+    assert admission.admit("U", {"lane": 2, "duration": 1000, "priority": 0}, 1.5)[1] is None
+
+
+def test_null_fields_do_not_corrupt_entry():
+    admission = make_admission(unit_id="U")
+    cmd, err = admission.admit("U", {"lane": 1, "time": None, "priority": None}, 0.0)
+    assert err is None
+    entry = admission.units["U"]
+    assert entry.priority == 0
+    assert entry.deadline == DEFAULT_DURATION_MS / 1000.0
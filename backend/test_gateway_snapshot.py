@@ -0,0 +1,99 @@
+import struct
+
+import pytest
+
+from anomaly_detector import AnomalyDetector
+from command_admission import CommandAdmission
+from gateway_snapshot import HEADER, MAGIC, RECORD, VERSION, load_snapshot, save_snapshot
+
+NOW = 1_000_000.0
+
+
+def make_state():
+    admission = CommandAdmission()
+    detector = AnomalyDetector(lambda alert: None)
+    for unit_id in ("INT_LIVE", "INT_DONE", "INT_IDLE"):
+        admission.register(unit_id, NOW)
+    detector.observe("INT_LIVE", "Green: Lane 2", NOW)
+    detector.observe("INT_DONE", "Green: Lane 1", NOW)
+    detector.observe("INT_IDLE", "ONLINE", NOW)
+    admission.admit("INT_LIVE", {"lane": 3, "duration": 60000, "priority": 4}, NOW)
+    admission.admit("INT_DONE", {"lane": 0, "duration": 2000}, NOW)
+    return admission, detector
+
+
+def load_fresh(path, now):
+    admission = CommandAdmission()
+    detector = AnomalyDetector(lambda alert: None)
+    count, resumed = load_snapshot(path, admission, detector, now)
+    return count, resumed, admission, detector
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    path = str(tmp_path / "gateway_state.snap")
+    save_snapshot(path, *make_state(), now=NOW)
+    return path
+
+
+def test_round_trip_restores_units(snapshot_path):
+    count, _, admission, detector = load_fresh(snapshot_path, NOW + 10)
+    assert count == 3
+    assert set(admission.units) == {"INT_LIVE", "INT_DONE", "INT_IDLE"}
+    seen = detector.snapshot()
+    assert seen["INT_LIVE"] == (NOW, 2)
+    assert seen["INT_DONE"] == (NOW, 1)
+
+
+def test_live_override_resumes_with_original_deadline(snapshot_path):
+    _, resumed, admission, _ = load_fresh(snapshot_path, NOW + 10)
+    assert resumed == [("INT_LIVE", 3, NOW + 60)]
+    entry = admission.units["INT_LIVE"]
+    assert (entry.lane, entry.priority, entry.deadline) == (3, 4, NOW + 60)
+
+
+def test_expired_override_is_dropped(snapshot_path):
+    _, resumed, admission, _ = load_fresh(snapshot_path, NOW + 10)
+    assert "INT_DONE" not in [unit_id for unit_id, _, _ in resumed]
+    assert admission.units["INT_DONE"].lane is None
+
+
+def test_no_lane_round_trips_to_none(snapshot_path):
+    _, _, admission, detector = load_fresh(snapshot_path, NOW + 10)
+    assert admission.units["INT_IDLE"].lane is None
+    assert detector.snapshot()["INT_IDLE"] == (NOW, None)
+
+
+def test_missing_file(tmp_path):
+    admission = CommandAdmission()
+    detector = AnomalyDetector(lambda alert: None)
+    assert load_snapshot(str(tmp_path / "missing.snap"), admission, detector) == (0, [])
+    assert admission.units == {}
+
+
+@pytest.mark.parametrize("keep", [HEADER.size - 1, HEADER.size + RECORD.size + 5])
+def test_truncated_file(snapshot_path, keep):
+    with open(snapshot_path, "rb") as f:
+        data = f.read()
+    with open(snapshot_path, "wb") as f:
+        f.write(data[:keep])
+    with pytest.raises(ValueError):
+        load_fresh(snapshot_path, NOW)
+
+
+def test_bad_crc(snapshot_path):
+    with open(snapshot_path, "r+b") as f:
+        f.seek(HEADER.size + 40)
+        byte = f.read(1)
+        f.seek(-1, 1)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    with pytest.raises(ValueError, match="corrupt"):
+        load_fresh(snapshot_path, NOW)
+
+
+def test_old_version(snapshot_path):
+    with open(snapshot_path, "r+b") as f:
+        f.seek(len(MAGIC))
+        f.write(struct.pack("<H", VERSION - 1))
+    with pytest.raises(ValueError, match="unsupported"):
+        load_fresh(snapshot_path, NOW)
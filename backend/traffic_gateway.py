@@ -8,6 +8,10 @@ from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
 
 import os
 
+from anomaly_detector import AnomalyDetector
+from command_admission import CommandAdmission, POLICY_PRIORITY
+from gateway_snapshot import load_snapshot, save_snapshot
+
 # --- CONFIGURATION ---
 # 1. AWS Config
 AWS_ENDPOINT = "a23rgceujjdkf1-ats.iot.us-east-1.amazonaws.com"
@@ -24,19 +28,85 @@ PATH_TO_ROOT = os.path.join(CONFIG_DIR, "root-CA.crt")
 LOCAL_BROKER = "localhost" 
 LOCAL_PORT = 1883
 
+# 3. Override Admission ("priority" or "latest")
+CONFLICT_POLICY = POLICY_PRIORITY
+
+# 4. Warm Restart Snapshot
+SNAPSHOT_PATH = os.path.join(BASE_DIR, "gateway_state.snap")
+SNAPSHOT_INTERVAL_S = 10
+
 
 # --- TOPICS ---
 TOPIC_LOGS_IN = "traffic/+/logs"      
 TOPIC_LOGS_OUT = "traffic/gateway/logs"
 TOPIC_CMD_IN = "traffic/+/control"    # CHANGED: Listen to all device control commands
+TOPIC_ALERTS_OUT = "traffic/gateway/alerts"
+TOPIC_STATE_OUT = "traffic/gateway/state"
+# AWS IoT caps messages at 128 KB: a page of 500 units stays well below it
+STATE_PAGE_UNITS = 500
 
-# --- AWS CONNECTION ---
-print("[GATEWAY] Connecting to AWS IoT Core...")
+# WS clients are unauthenticated: only the web twin's logs may register a unit
+WEB_TWIN_ID = "INT_WEB"
+
+# --- ANOMALY DETECTION ---
+def publish_alert(alert):
+    print(f"[ALERT] {alert['unit_id']} {alert['kind']} {alert['state']} {alert['detail']}")
+    broadcast_ws(alert)
+    if not aws_connected.is_set():
+        return
+    try:
+        aws_client.publish(TOPIC_ALERTS_OUT, json.dumps(alert), 1)
+    except Exception as e:
+        print(f"[ALERT ERROR] {e}")
+
+detector = AnomalyDetector(publish_alert)
+
+# --- COMMAND ADMISSION ---
+admission = CommandAdmission(CONFLICT_POLICY)
+
+# --- WARM RESTART ---
+# Loaded before any network connect so the gateway knows its units immediately
+try:
+    restored, resumed_overrides = load_snapshot(SNAPSHOT_PATH, admission, detector)
+    print(f"[SNAPSHOT] Restored {restored} units, {len(resumed_overrides)} active overrides")
+except Exception as e:
+    resumed_overrides = []
+    print(f"[SNAPSHOT] Ignoring unreadable snapshot ({e})")
+
+def gateway_state():
+    now = time.time()
+    seen = detector.snapshot()
+    units = []
+    overrides = []
+    for unit_id, _, _, lane, _, _, deadline in admission.snapshot():
+        last_seen, current_lane = seen.get(unit_id, (None, None))
+        units.append({"unit_id": unit_id, "lane": current_lane, "last_seen": last_seen})
+        if lane is not None and deadline > now:
+            overrides.append({"target": unit_id, "lane": lane, "deadline": deadline})
+    return {"type": "state", "units": units, "overrides": overrides, "timestamp": now}
+
+def gateway_state_pages(state):
+    """Splits gateway_state() into AWS-sized messages (WS clients get the whole state)."""
+    units = state["units"]
+    pages = max(1, -(-len(units) // STATE_PAGE_UNITS))
+    for page in range(pages):
+        chunk = units[page * STATE_PAGE_UNITS:(page + 1) * STATE_PAGE_UNITS]
+        ids = {u["unit_id"] for u in chunk}
+        yield {
+            "type": "state",
+            "page": page,
+            "pages": pages,
+            "units": chunk,
+            "overrides": [o for o in state["overrides"] if o["target"] in ids],
+            "timestamp": state["timestamp"],
+        }
+
+# --- AWS CLIENT ---
 aws_client = AWSIoTMQTTClient(CLIENT_ID)
 aws_client.configureEndpoint(AWS_ENDPOINT, 8883)
 aws_client.configureCredentials(PATH_TO_ROOT, PATH_TO_KEY, PATH_TO_CERT)
-aws_client.connect()
-print("[GATEWAY] AWS Connected!")
+# The WS server starts before connect(); AWS publishes are skipped until this is set
+aws_connected = threading.Event()
 
 # --- WEB SOCKET BRIDGE ---
 ws_clients = set()
@@ -45,6 +115,8 @@ ws_loop = None
 async def ws_handler(websocket):
     ws_clients.add(websocket)
     try:
+        # New clients get the known units and overrides right away
+        await websocket.send(json.dumps(gateway_state()))
         async for message in websocket:
             try:
                 data = json.loads(message)
@@ -58,7 +130,13 @@ async def ws_handler(websocket):
                     unit_id = parts[1] if len(parts) > 1 else "INT_WEB"
                     
                     print(f"[WS -> AWS] {unit_id}: {payload}")
-                    
+                    if unit_id == WEB_TWIN_ID:
+                        now = time.time()
+                        admission.register(unit_id, now)
+                        detector.observe(unit_id, payload, now)
+
+                    if not aws_connected.is_set():
+                        continue
                     aws_payload = json.dumps({
                         "unit_id": unit_id,
                         "data": payload,
@@ -103,6 +181,42 @@ async def broadcast_to_all(msg):
         except:
             pass
 
+# --- AWS CONNECTION ---
+# Started after the WS server so dashboards get the restored state while AWS connects
+print("[GATEWAY] Connecting to AWS IoT Core...")
+aws_client.connect()
+aws_connected.set()
+print("[GATEWAY] AWS Connected!")
+
+
+# --- BACKGROUND TASKS ---
+def run_detector_ticks():
+    while True:
+        time.sleep(1)
+        try:
+            detector.tick(time.time())
+        except Exception as e:
+            print(f"[ALERT ERROR] {e}")
+
+detector_thread = threading.Thread(target=run_detector_ticks, daemon=True)
+detector_thread.start()
+
+snapshot_requested = threading.Event()
+
+def run_snapshots():
+    while True:
+        snapshot_requested.wait(SNAPSHOT_INTERVAL_S)
+        snapshot_requested.clear()
+        try:
+            save_snapshot(SNAPSHOT_PATH, admission, detector)
+            for page in gateway_state_pages(gateway_state()):
+                aws_client.publish(TOPIC_STATE_OUT, json.dumps(page), 1)
+        except Exception as e:
+            print(f"[SNAPSHOT ERROR] {e}")
+
+snapshot_thread = threading.Thread(target=run_snapshots, daemon=True)
+snapshot_thread.start()
+
 # --- CALLBACKS ---
 def on_local_message(client, userdata, msg):
     try:
@@ -112,6 +226,9 @@ def on_local_message(client, userdata, msg):
         unit_id = parts[1] if len(parts) > 1 else "UNKNOWN"
         
         print(f"[LOCAL -> AWS] {unit_id}: {payload}")
+        now = time.time()
+        admission.register(unit_id, now)
+        detector.observe(unit_id, payload, now)
         
         broadcast_ws({
             "type": "log",
@@ -130,6 +247,19 @@ def on_local_message(client, userdata, msg):
     except Exception as e:
         print(f"Error forwarding: {e}")
 
+def send_override(target_unit, lane, duration):
+    # A. Forward to Local MQTT (for ESP32)
+    # Rebuilt from the validated command, the ESP32 parser expects exactly {"lane", "time"}
+    local_client.publish(f"traffic/{target_unit}/control", json.dumps({"lane": lane, "time": duration}))
+
+    # B. Broadcast to Web Twin via WebSocket
+    broadcast_ws({
+        "type": "command",
+        "target": target_unit,
+        "lane": lane,
+        "duration": duration
+    })
+
 def on_aws_message(client, userdata, msg):
     try:
         print(f"[AWS -> GATEWAY] Message on {msg.topic}")
@@ -139,25 +269,22 @@ def on_aws_message(client, userdata, msg):
         parts = msg.topic.split("/")
         target_unit = parts[1] if len(parts) > 1 else "UNKNOWN"
         
-        # 2. Parse Command
-        lane = payload.get("lane")
-        duration = payload.get("duration", payload.get("time", 5000)) # Support both
-        
-        if lane is not None:
-             print(f"[AWS -> LOCAL/WS] Override {target_unit} Lane {lane} for {duration}ms")
-             
-             # A. Forward to Local MQTT (for ESP32)
-             # payload is already JSON, easy to forward
-             local_client.publish(msg.topic, json.dumps({"lane": lane, "time": duration}))
-             
-             # B. Broadcast to Web Twin via WebSocket
-             broadcast_ws({
-                "type": "command",
+        # 2. Admit Command (schema, lane range, rate limit, conflicts)
+        cmd, reason = admission.admit(target_unit, payload, time.time())
+        if cmd is None:
+            print(f"[AWS -> GATEWAY] Rejected command for {target_unit}: {reason}")
+            broadcast_ws({
+                "type": "command_rejected",
                 "target": target_unit,
-                "lane": lane,
-                "duration": duration
+                "reason": reason
             })
-            
+            return
+
+        print(f"[AWS -> LOCAL/WS] Override {target_unit} Lane {cmd['lane']} for {cmd['duration']}ms")
+        send_override(target_unit, cmd["lane"], cmd["duration"])
+        # Persist the new deadline without waiting for the next periodic snapshot
+        snapshot_requested.set()
+
     except Exception as e:
         print(f"Error parsing AWS command: {e}")
 
@@ -178,5 +305,22 @@ while not connected_local:
 local_client.subscribe(TOPIC_LOGS_IN)
 aws_client.subscribe(TOPIC_CMD_IN, 1, on_aws_message)
 
+# Re-issue overrides that were still running at shutdown, for their remaining time only
+for unit_id, lane, deadline in resumed_overrides:
+    remaining = int((deadline - time.time()) * 1000)
+    if remaining > 0:
+        print(f"[SNAPSHOT] Resuming override {unit_id} Lane {lane} for {remaining}ms")
+        send_override(unit_id, lane, remaining)
+snapshot_requested.set()
+
 print("[GATEWAY] Bridge Active. Press Ctrl+C to stop.")
-local_client.loop_forever()
+try:
+    local_client.loop_forever()
+except KeyboardInterrupt:
+    pass
+finally:
+    try:
+        save_snapshot(SNAPSHOT_PATH, admission, detector)
+        print("[SNAPSHOT] Saved on shutdown.")
+    except Exception as e:
+        print(f"[SNAPSHOT ERROR] {e}")